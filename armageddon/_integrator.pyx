@@ -0,0 +1,242 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+# cython: cdivision=True, initializedcheck=False
+"""
+Compiled RK4 integrator for the atmospheric entry equations.
+
+This is an ahead-of-time compiled version of ``solver._integrate_rk4``,
+used in its place when numba is not installed. Build it with
+``python setup.py build_ext --inplace`` (requires Cython).
+"""
+from libc.math cimport exp, sin, cos, sqrt, fabs, M_PI
+import numpy as np
+
+
+# Upper bound on the number of integration steps, as in solver.py
+cdef Py_ssize_t MAX_STEPS = 10000000
+
+# Upper bound on the first guess of the number of outputs, as in solver.py
+cdef Py_ssize_t MAX_INITIAL_ROWS = 4096
+
+# Codes identifying the atmospheric density profile, as in solver.py
+cdef enum:
+    ATMOS_EXPONENTIAL = 0
+    ATMOS_TABULAR = 1
+    ATMOS_CONSTANT = 2
+    ATMOS_EXPONENTIAL_LINEAR = 3
+
+# Largest altitude change, in scale heights, over which the exponential
+# density is extrapolated linearly, as in solver.py
+cdef double RHOA_LINEAR_TOL = 1e-3
+
+
+cdef struct Params:
+    double Cd, Ch, inv_2Q, Cl, Rp, g, inv_H, rho0, strength, frag_k
+    int atmos_kind
+    const double* table_z
+    const double* table_rho
+    Py_ssize_t table_n
+
+
+cdef double _tabular_density(double z, const Params* p) noexcept nogil:
+    """
+    Linearly interpolate the tabulated atmospheric density at altitude z
+    """
+    cdef Py_ssize_t lo = 0, hi = p.table_n, mid, i, j
+    if z > 100e3:
+        return 0.
+    # first tabulated altitude at or above z, or the last one if z is
+    # above the table
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if p.table_z[mid] < z:
+            lo = mid + 1
+        else:
+            hi = mid
+    i = lo if lo < p.table_n else p.table_n - 1
+    j = i - 1 if i > 0 else p.table_n - 1
+    return ((z - p.table_z[j]) / (p.table_z[i] - p.table_z[j])
+            * (p.table_rho[i] - p.table_rho[j]) + p.table_rho[j])
+
+
+cdef double _atmos_density(double z, const Params* p) noexcept nogil:
+    """
+    Atmospheric density at altitude z for the given density profile
+    """
+    if p.atmos_kind == ATMOS_TABULAR:
+        return _tabular_density(z, p)
+    if p.atmos_kind == ATMOS_CONSTANT:
+        return p.rho0
+    return p.rho0 * exp(-z * p.inv_H)
+
+
+cdef double _stage_density(double z, double altitude, double rhoa,
+                           const Params* p) noexcept nogil:
+    """
+    Atmospheric density at altitude z within an RK4 step which started at
+    altitude with density rhoa
+    """
+    cdef double dz_H = (z - altitude) * p.inv_H
+    if (p.atmos_kind == ATMOS_EXPONENTIAL_LINEAR
+            and fabs(dz_H) < RHOA_LINEAR_TOL):
+        return rhoa * (1. - dz_H)
+    return _atmos_density(z, p)
+
+
+cdef bint _derivatives(const double* s, double rhoa, const Params* p,
+                       double* k) noexcept nogil:
+    """
+    Write the time derivatives of the state s (angle, radius, altitude,
+    velocity, mass, distance) at atmospheric density rhoa into k,
+    returning True if the ram pressure exceeds the strength of the asteroid
+    """
+    cdef double angle = s[0], radius = s[1], altitude = s[2]
+    cdef double velocity = s[3], mass = s[4]
+    cdef double cos_theta = cos(angle)
+    cdef double sin_theta = sin(angle)
+    cdef double area = M_PI * radius * radius
+    cdef double rhoAv = rhoa * area * velocity
+    cdef double inv_2m = 0.5 / mass
+    # 1 / (Rp + z), also used for 1 / (1 + z / Rp) = Rp / (Rp + z)
+    cdef double inv_Rp_z = 1 / (p.Rp + altitude)
+    cdef double v_cos_theta = velocity * cos_theta
+    cdef bint burst = rhoa * velocity * velocity > p.strength
+    k[0] = (-p.Cl * rhoAv * inv_2m
+            + p.g * cos_theta / velocity
+            - v_cos_theta * inv_Rp_z)
+    k[1] = sqrt(p.frag_k * rhoa) * velocity if burst else 0.
+    k[2] = -velocity * sin_theta
+    k[3] = -p.Cd * rhoAv * velocity * inv_2m + p.g * sin_theta
+    k[4] = -p.Ch * rhoAv * velocity * velocity * p.inv_2Q
+    k[5] = v_cos_theta * p.Rp * inv_Rp_z
+    return burst
+
+
+cdef bint _rk4_step(const double* s, double dt, const Params* p,
+                    double* change) noexcept nogil:
+    """
+    Write the change of the state s over one RK4 step of size dt into
+    change, returning True if the ram pressure exceeded the strength at
+    any of the four stages
+    """
+    cdef double k1[6]
+    cdef double k2[6]
+    cdef double k3[6]
+    cdef double k4[6]
+    cdef double tmp[6]
+    cdef double h = 0.5 * dt, sixth = dt / 6
+    cdef double rhoa = _atmos_density(s[2], p)
+    cdef bint burst
+    cdef int j
+    burst = _derivatives(s, rhoa, p, k1)
+    for j in range(6):
+        tmp[j] = s[j] + h * k1[j]
+    burst |= _derivatives(tmp, _stage_density(tmp[2], s[2], rhoa, p), p, k2)
+    for j in range(6):
+        tmp[j] = s[j] + h * k2[j]
+    burst |= _derivatives(tmp, _stage_density(tmp[2], s[2], rhoa, p), p, k3)
+    for j in range(6):
+        tmp[j] = s[j] + dt * k3[j]
+    burst |= _derivatives(tmp, _stage_density(tmp[2], s[2], rhoa, p), p, k4)
+    for j in range(6):
+        change[j] = (k1[j] + 2 * (k2[j] + k3[j]) + k4[j]) * sixth
+    return burst
+
+
+def _grow(buffer, Py_ssize_t n):
+    """
+    Return a copy of buffer with twice as many rows, keeping the first n
+    """
+    out = np.empty((2 * buffer.shape[0],) + buffer.shape[1:])
+    out[:n] = buffer[:n]
+    return out
+
+
+def integrate_rk4(double radius, double velocity, double angle,
+                  double init_altitude, double dt, double actualdt,
+                  double Cd, double Ch, double Q, double Cl, double alpha,
+                  double Rp, double g, double H, double rho0,
+                  double strength, double density, int atmos_kind,
+                  const double[::1] table_z, const double[::1] table_rho):
+    """
+    Integrate the system with RK4 steps of size dt, interpolating the
+    solution every actualdt seconds.
+
+    Returns an (N, 7) array whose columns are the velocity, mass, angle,
+    altitude, distance, radius and time at the output times, the output
+    index at which the asteroid first fragmented (-1 if it never did), and
+    a flag which is True if the integration was cut off after MAX_STEPS
+    steps.
+    """
+    cdef Params p
+    cdef double s[6]
+    cdef double change[6]
+    cdef double rate, descent, acumulated_step = 0.
+    cdef Py_ssize_t n = 1, burstpoint = -1, nmax, step
+    cdef bint burst, flag, capped = True
+    cdef int j
+
+    p.Cd, p.Ch, p.Cl, p.Rp, p.g = Cd, Ch, Cl, Rp, g
+    p.inv_2Q = 0.5 / Q
+    p.inv_H = 1 / H
+    p.rho0, p.strength = rho0, strength
+    # spreading rate constant of the fragmented asteroid
+    p.frag_k = 7 * alpha / (2 * density)
+    p.atmos_kind = atmos_kind
+    p.table_n = table_z.shape[0]
+    p.table_z = &table_z[0] if p.table_n > 0 else NULL
+    p.table_rho = &table_rho[0] if p.table_n > 0 else NULL
+
+    # estimate of the number of outputs from the initial descent rate;
+    # the buffer is grown if the asteroid is slowed down
+    descent = max(velocity * sin(angle), 1.)
+    nmax = min(<Py_ssize_t>(init_altitude / (actualdt * descent)) + 16,
+               MAX_INITIAL_ROWS)
+    state_array = np.empty((nmax, 7))
+    cdef double[:, ::1] state = state_array
+
+    s[0] = angle
+    s[1] = radius
+    s[2] = init_altitude
+    s[3] = velocity
+    s[4] = 4. / 3. * M_PI * radius * radius * radius * density
+    s[5] = 0.
+    state[0, 0] = s[3]
+    state[0, 1] = s[4]
+    state[0, 2] = s[0]
+    state[0, 3] = s[2]
+    state[0, 4] = s[5]
+    state[0, 5] = s[1]
+    state[0, 6] = 0.
+    with nogil:
+        for step in range(MAX_STEPS):
+            burst = _rk4_step(s, dt, &p, change)
+            if burst and burstpoint == -1:
+                burstpoint = n
+            # same tolerance as np.isclose
+            flag = (fabs(acumulated_step + dt - actualdt)
+                    <= 1e-8 + 1e-5 * fabs(actualdt))
+            if acumulated_step + dt >= actualdt or flag:
+                if n == state.shape[0]:
+                    with gil:
+                        state_array = _grow(state_array, n)
+                        state = state_array
+                rate = (actualdt - acumulated_step) / dt
+                state[n, 0] = s[3] + rate * change[3]
+                state[n, 1] = s[4] + rate * change[4]
+                state[n, 2] = s[0] + rate * change[0]
+                state[n, 3] = s[2] + rate * change[2]
+                state[n, 4] = s[5] + rate * change[5]
+                state[n, 5] = s[1] + rate * change[1]
+                state[n, 6] = state[n-1, 6] + actualdt
+                n += 1
+                acumulated_step -= actualdt
+            for j in range(6):
+                s[j] += change[j]
+            if (s[2] <= 0 or s[2] >= init_altitude or s[4] <= 0 or
+                    s[3] <= 0 or s[1] <= 0):
+                capped = False
+                break
+            acumulated_step += dt
+            if flag:
+                acumulated_step = 0.
+    return state_array[:n], burstpoint, capped
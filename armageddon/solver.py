@@ -1,6 +1,493 @@
 import os
+import math
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left
 import numpy as np
 import pandas as pd
+from scipy.integrate import solve_ivp
+
+try:
+    from numba import njit as _njit, prange as _prange
+    _HAVE_NUMBA = True
+except ImportError:
+    _HAVE_NUMBA = False
+    _prange = range
+
+    def _njit(*args, **kwargs):
+        """
+        Stand-in for ``numba.njit`` when numba is not installed, so that the
+        integration kernels below run as plain Python
+        """
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+# Upper bound on the number of integration steps of a single scenario
+_MAX_STEPS = 10**7
+
+# Upper bound on the first guess of the number of trajectory rows; the
+# buffers are grown on demand past it
+_MAX_INITIAL_ROWS = 4096
+
+# Codes identifying the atmospheric density profile inside the kernels
+_ATMOS_EXPONENTIAL = 0
+_ATMOS_TABULAR = 1
+_ATMOS_CONSTANT = 2
+# exponential profile, extrapolated linearly between the stages of an RK4
+# step (Planet(linear_density=True))
+_ATMOS_EXPONENTIAL_LINEAR = 3
+
+# Largest altitude change, in scale heights, over which the exponential
+# density is extrapolated linearly between the stages of an RK4 step
+_RHOA_LINEAR_TOL = 1e-3
+
+
+@_njit(cache=True)
+def _tabular_density(z, table_z, table_rho):
+    """
+    Linearly interpolate the tabulated atmospheric density at altitude z.
+    Mirrors the closure returned by ``Planet.create_tabular_density``.
+    """
+    if z > 100e3:
+        return 0.
+    # first tabulated altitude at or above z, or the last one if z is
+    # above the table
+    i = min(np.searchsorted(table_z, z), table_z.shape[0] - 1)
+    return ((z - table_z[i-1]) / (table_z[i] - table_z[i-1])
+            * (table_rho[i] - table_rho[i-1]) + table_rho[i-1])
+
+
+@_njit(cache=True)
+def _atmos_density(z, atmos_kind, rho0, inv_H, table_z, table_rho):
+    """
+    Atmospheric density at altitude z for the given density profile
+    """
+    if atmos_kind == _ATMOS_TABULAR:
+        return _tabular_density(z, table_z, table_rho)
+    if atmos_kind == _ATMOS_CONSTANT:
+        return rho0
+    return rho0 * math.exp(-z * inv_H)
+
+
+@_njit(cache=True)
+def _stage_density(z, altitude, rhoa, atmos_kind, rho0, inv_H, table_z,
+                   table_rho):
+    """
+    Atmospheric density at altitude z within an RK4 step which started at
+    altitude with density rhoa. With _ATMOS_EXPONENTIAL_LINEAR, small
+    altitude changes are extrapolated linearly instead of calling exp again.
+    """
+    dz_H = (z - altitude) * inv_H
+    if (atmos_kind == _ATMOS_EXPONENTIAL_LINEAR
+            and abs(dz_H) < _RHOA_LINEAR_TOL):
+        return rhoa * (1. - dz_H)
+    return _atmos_density(z, atmos_kind, rho0, inv_H, table_z, table_rho)
+
+
+@_njit(cache=True)
+def _derivatives(angle, radius, altitude, velocity, mass,
+                 Cd, Ch, inv_2Q, Cl, Rp, g, inv_H, rho0, strength, frag_k,
+                 atmos_kind, table_z, table_rho):
+    """
+    Time derivatives of angle, radius, altitude, velocity, mass and
+    distance, followed by a flag which is True if the ram pressure exceeds
+    the strength of the asteroid
+    """
+    rhoa = _atmos_density(altitude, atmos_kind, rho0, inv_H,
+                          table_z, table_rho)
+    return _rates(angle, radius, altitude, velocity, mass, rhoa,
+                  Cd, Ch, inv_2Q, Cl, Rp, g, strength, frag_k)
+
+
+@_njit(cache=True)
+def _rates(angle, radius, altitude, velocity, mass, rhoa,
+           Cd, Ch, inv_2Q, Cl, Rp, g, strength, frag_k):
+    """
+    As _derivatives, for a known atmospheric density rhoa
+    """
+    cos_theta = math.cos(angle)
+    sin_theta = math.sin(angle)
+    area = math.pi * radius * radius
+    rhoAv = rhoa * area * velocity
+    inv_2m = 0.5 / mass
+    # 1 / (Rp + z), also used for 1 / (1 + z / Rp) = Rp / (Rp + z)
+    inv_Rp_z = 1 / (Rp + altitude)
+    v_cos_theta = velocity * cos_theta
+    dvdt = -Cd * rhoAv * velocity * inv_2m + g * sin_theta
+    dmdt = -Ch * rhoAv * velocity * velocity * inv_2Q
+    dthetadt = (-Cl * rhoAv * inv_2m
+                + g * cos_theta / velocity
+                - v_cos_theta * inv_Rp_z)
+    dzdt = -velocity * sin_theta
+    dxdt = v_cos_theta * Rp * inv_Rp_z
+    burst = rhoa * velocity * velocity > strength
+    drdt = 0.
+    if burst:
+        drdt = math.sqrt(frag_k * rhoa) * velocity
+    return dthetadt, drdt, dzdt, dvdt, dmdt, dxdt, burst
+
+
+@_njit(cache=True)
+def _rk4_step(angle, radius, altitude, velocity, mass, dt,
+              Cd, Ch, inv_2Q, Cl, Rp, g, inv_H, rho0, strength, frag_k,
+              atmos_kind, table_z, table_rho):
+    """
+    Change of angle, radius, altitude, velocity, mass and distance over
+    one RK4 step of size dt, followed by a flag which is True if the ram
+    pressure exceeded the strength at any of the four stages
+    """
+    rhoa = _atmos_density(altitude, atmos_kind, rho0, inv_H,
+                          table_z, table_rho)
+    a1, r1, z1, v1, m1, x1, b1 = _rates(
+        angle, radius, altitude, velocity, mass, rhoa,
+        Cd, Ch, inv_2Q, Cl, Rp, g, strength, frag_k)
+    h = 0.5 * dt
+    z = altitude + h * z1
+    a2, r2, z2, v2, m2, x2, b2 = _rates(
+        angle + h * a1, radius + h * r1, z, velocity + h * v1, mass + h * m1,
+        _stage_density(z, altitude, rhoa, atmos_kind, rho0, inv_H,
+                       table_z, table_rho),
+        Cd, Ch, inv_2Q, Cl, Rp, g, strength, frag_k)
+    z = altitude + h * z2
+    a3, r3, z3, v3, m3, x3, b3 = _rates(
+        angle + h * a2, radius + h * r2, z, velocity + h * v2, mass + h * m2,
+        _stage_density(z, altitude, rhoa, atmos_kind, rho0, inv_H,
+                       table_z, table_rho),
+        Cd, Ch, inv_2Q, Cl, Rp, g, strength, frag_k)
+    z = altitude + dt * z3
+    a4, r4, z4, v4, m4, x4, b4 = _rates(
+        angle + dt * a3, radius + dt * r3, z, velocity + dt * v3,
+        mass + dt * m3,
+        _stage_density(z, altitude, rhoa, atmos_kind, rho0, inv_H,
+                       table_z, table_rho),
+        Cd, Ch, inv_2Q, Cl, Rp, g, strength, frag_k)
+    sixth = dt / 6
+    return ((a1 + 2 * (a2 + a3) + a4) * sixth,
+            (r1 + 2 * (r2 + r3) + r4) * sixth,
+            (z1 + 2 * (z2 + z3) + z4) * sixth,
+            (v1 + 2 * (v2 + v3) + v4) * sixth,
+            (m1 + 2 * (m2 + m3) + m4) * sixth,
+            (x1 + 2 * (x2 + x3) + x4) * sixth,
+            b1 or b2 or b3 or b4)
+
+
+@_njit(cache=True)
+def _advance(angle, radius, altitude, velocity, mass, distance,
+             acumulated_step, init_altitude, dt, actualdt,
+             Cd, Ch, inv_2Q, Cl, Rp, g, inv_H, rho0, strength, frag_k,
+             atmos_kind, table_z, table_rho):
+    """
+    Take one RK4 step of size dt from the given state, where
+    acumulated_step is the time since the last output.
+
+    Returns the new angle, radius, altitude, velocity, mass, distance and
+    time since the last output, a flag which is True if the step reached
+    the next output time, the velocity, mass, angle, altitude, distance and
+    radius interpolated at that time, a flag which is True if the ram
+    pressure exceeded the strength during the step, and a flag which is
+    True if the integration should stop.
+    """
+    da, dr, dz, dv, dm, dx, burst = _rk4_step(
+        angle, radius, altitude, velocity, mass, dt,
+        Cd, Ch, inv_2Q, Cl, Rp, g, inv_H, rho0, strength, frag_k,
+        atmos_kind, table_z, table_rho)
+    # same tolerance as np.isclose
+    flag = (abs(acumulated_step + dt - actualdt)
+            <= 1e-8 + 1e-5 * abs(actualdt))
+    output = acumulated_step + dt >= actualdt or flag
+    rate = (actualdt - acumulated_step) / dt
+    row = (velocity + rate * dv, mass + rate * dm, angle + rate * da,
+           altitude + rate * dz, distance + rate * dx, radius + rate * dr)
+    if output:
+        acumulated_step -= actualdt
+    angle += da
+    radius += dr
+    altitude += dz
+    velocity += dv
+    mass += dm
+    distance += dx
+    stop = (altitude <= 0 or altitude >= init_altitude or mass <= 0 or
+            velocity <= 0 or radius <= 0)
+    acumulated_step += dt
+    if flag:
+        acumulated_step = 0.
+    return (angle, radius, altitude, velocity, mass, distance,
+            acumulated_step, output, row, burst, stop)
+
+
+@_njit(cache=True)
+def _grow(buffer, n):
+    """
+    Return a copy of buffer with twice as many rows, keeping the first n
+    """
+    out = np.empty((2 * buffer.shape[0],) + buffer.shape[1:])
+    out[:n] = buffer[:n]
+    return out
+
+
+@_njit(cache=True, nogil=True)
+def _integrate_rk4(radius, velocity, angle, init_altitude, dt, actualdt,
+                   Cd, Ch, Q, Cl, alpha, Rp, g, H, rho0, strength, density,
+                   atmos_kind, table_z, table_rho):
+    """
+    Integrate the system with RK4 steps of size dt, interpolating the
+    solution every actualdt seconds.
+
+    Returns an (N, 7) array whose columns are the velocity, mass, angle,
+    altitude, distance, radius and time at the output times, the output
+    index at which the asteroid first fragmented (-1 if it never did), and
+    a flag which is True if the integration was cut off after _MAX_STEPS
+    steps.
+    """
+    # estimate of the number of outputs from the initial descent rate;
+    # the buffer is grown if the asteroid is slowed down
+    descent = max(velocity * np.sin(angle), 1.)
+    nmax = min(int(init_altitude / (actualdt * descent)) + 16,
+               _MAX_INITIAL_ROWS)
+    state = np.empty((nmax, 7))
+
+    mass = 4/3 * np.pi * radius**3 * density
+    # spreading rate constant of the fragmented asteroid
+    frag_k = 7 * alpha / (2 * density)
+    inv_2Q = 0.5 / Q
+    inv_H = 1 / H
+    distance = 0.
+    altitude = init_altitude
+    state[0, 0] = velocity
+    state[0, 1] = mass
+    state[0, 2] = angle
+    state[0, 3] = altitude
+    state[0, 4] = distance
+    state[0, 5] = radius
+    state[0, 6] = 0.
+    n = 1
+    burstpoint = -1
+    acumulated_step = 0.
+    capped = True
+    for _ in range(_MAX_STEPS):
+        (angle, radius, altitude, velocity, mass, distance, acumulated_step,
+         output, row, burst, stop) = _advance(
+            angle, radius, altitude, velocity, mass, distance,
+            acumulated_step, init_altitude, dt, actualdt,
+            Cd, Ch, inv_2Q, Cl, Rp, g, inv_H, rho0, strength, frag_k,
+            atmos_kind, table_z, table_rho)
+        if burst and burstpoint == -1:
+            burstpoint = n
+        if output:
+            if n == state.shape[0]:
+                state = _grow(state, n)
+            for j in range(6):
+                state[n, j] = row[j]
+            state[n, 6] = state[n-1, 6] + actualdt
+            n += 1
+        if stop:
+            capped = False
+            break
+    return state[:n], burstpoint, capped
+
+
+@_njit(cache=True, nogil=True)
+def _integrate_and_analyse(radius, velocity, angle, init_altitude, dt,
+                           actualdt, Cd, Ch, Q, Cl, alpha, Rp, g, H, rho0,
+                           strength, density, atmos_kind, table_z,
+                           table_rho):
+    """
+    Integrate the system as _integrate_rk4 does, but only keep track of the
+    airburst statistics instead of storing the trajectory.
+
+    Returns the peak dedz, burst altitude, burst distance and burst energy
+    as computed by ``Planet.analyse_outcome``, followed by a flag which is
+    True for a cratering event and a flag which is True if the integration
+    was cut off after _MAX_STEPS steps.
+    """
+    mass = 4/3 * np.pi * radius**3 * density
+    frag_k = 7 * alpha / (2 * density)
+    inv_2Q = 0.5 / Q
+    inv_H = 1 / H
+    distance = 0.
+    altitude = init_altitude
+    initial_energy = 0.5 * mass * velocity * velocity
+    prev_energy = initial_energy
+    prev_altitude = altitude
+    # the burst point starts at the first output, where dedz is zero
+    peak_dedz = 0.
+    burst_altitude = altitude
+    burst_distance = distance
+    burst_energy = initial_energy
+    burst_is_last = True
+    acumulated_step = 0.
+    capped = True
+    for _ in range(_MAX_STEPS):
+        (angle, radius, altitude, velocity, mass, distance, acumulated_step,
+         output, row, burst, stop) = _advance(
+            angle, radius, altitude, velocity, mass, distance,
+            acumulated_step, init_altitude, dt, actualdt,
+            Cd, Ch, inv_2Q, Cl, Rp, g, inv_H, rho0, strength, frag_k,
+            atmos_kind, table_z, table_rho)
+        if output:
+            out_v, out_m, _, out_z, out_x, _ = row
+            energy = 0.5 * out_m * out_v * out_v
+            dedz = (prev_energy - energy) / (prev_altitude - out_z) / 4.184e9
+            burst_is_last = False
+            # NaN dedz are skipped, as np.nanargmax does in analyse_outcome
+            if not math.isnan(dedz) and dedz > peak_dedz:
+                peak_dedz = dedz
+                burst_altitude = out_z
+                burst_distance = out_x
+                burst_energy = energy
+                burst_is_last = True
+            prev_energy = energy
+            prev_altitude = out_z
+        if stop:
+            capped = False
+            break
+    # kinetic energies in kilotons TNT
+    initial_energy /= 4.184e12
+    burst_energy /= 4.184e12
+    cratering = burst_is_last and burst_altitude <= 100
+    if cratering:
+        burst_energy = max(burst_energy, initial_energy - burst_energy)
+        burst_altitude = 0.
+    else:
+        burst_energy = initial_energy - burst_energy
+    return (peak_dedz, burst_altitude, burst_distance, burst_energy,
+            cratering, capped)
+
+
+@_njit(cache=True, parallel=True)
+def _integrate_many(params, init_altitude, dt, actualdt,
+                    Cd, Ch, Q, Cl, alpha, Rp, g, H, rho0,
+                    atmos_kind, table_z, table_rho, out_stats):
+    """
+    Run _integrate_and_analyse for each row (radius, velocity, density,
+    strength, angle) of params, one scenario per thread, writing the peak
+    dedz, burst altitude, burst distance, burst energy and cratering flag
+    into the matching row of out_stats, followed by the step cap flag
+    """
+    for i in _prange(params.shape[0]):
+        stats = _integrate_and_analyse(
+            params[i, 0], params[i, 1], params[i, 4], init_altitude, dt,
+            actualdt, Cd, Ch, Q, Cl, alpha, Rp, g, H, rho0,
+            params[i, 3], params[i, 2], atmos_kind, table_z, table_rho)
+        out_stats[i, 0] = stats[0]
+        out_stats[i, 1] = stats[1]
+        out_stats[i, 2] = stats[2]
+        out_stats[i, 3] = stats[3]
+        out_stats[i, 4] = stats[4]
+        out_stats[i, 5] = stats[5]
+
+
+@_njit(cache=True, nogil=True)
+def _integrate_fe(radius, velocity, angle, init_altitude, dt,
+                  Cd, Ch, Q, Cl, alpha, Rp, g, H, rho0, strength, density,
+                  atmos_kind, table_z, table_rho):
+    """
+    Integrate the system with forward Euler steps of size dt.
+
+    Returns an (N, 7) array whose columns are the velocity, mass, angle,
+    altitude, distance, radius and time at every step, the step index at
+    which the asteroid first fragmented (-1 if it never did), and a flag
+    which is True if the integration was cut off after _MAX_STEPS steps.
+    """
+    # estimate of the number of steps from the initial descent rate;
+    # the buffer is grown if the asteroid is slowed down
+    descent = max(velocity * np.sin(angle), 1.)
+    nmax = min(int(np.ceil(init_altitude / (dt * descent))) + 16,
+               _MAX_INITIAL_ROWS)
+    state = np.empty((nmax, 7))
+
+    mass = 4/3 * np.pi * radius**3 * density
+    frag_k = 7 * alpha / (2 * density)
+    inv_2Q = 0.5 / Q
+    inv_H = 1 / H
+    altitude = init_altitude
+    distance = 0.
+    time = 0.
+    state[0, 0] = velocity
+    state[0, 1] = mass
+    state[0, 2] = angle
+    state[0, 3] = altitude
+    state[0, 4] = distance
+    state[0, 5] = radius
+    state[0, 6] = time
+    burstpoint = -1
+    capped = True
+    i = 0
+    for _ in range(_MAX_STEPS):
+        if i + 1 == state.shape[0]:
+            state = _grow(state, i + 1)
+        rhoa = _atmos_density(altitude, atmos_kind, rho0, inv_H,
+                              table_z, table_rho)
+        dthetadt, drdt, dzdt, dvdt, dmdt, dxdt, burst = _rates(
+            angle, radius, altitude, velocity, mass, rhoa,
+            Cd, Ch, inv_2Q, Cl, Rp, g, strength, frag_k)
+        if burst and burstpoint == -1:
+            burstpoint = i + 1
+        velocity += dvdt * dt
+        mass += dmdt * dt
+        altitude += dzdt * dt
+        angle += dthetadt * dt
+        distance += dxdt * dt
+        radius += drdt * dt
+        time += dt
+        i += 1
+        state[i, 0] = velocity
+        state[i, 1] = mass
+        state[i, 2] = angle
+        state[i, 3] = altitude
+        state[i, 4] = distance
+        state[i, 5] = radius
+        state[i, 6] = time
+        if (altitude <= 0 or altitude >= init_altitude or mass <= 0 or
+                velocity <= 0 or radius <= 0):
+            capped = False
+            break
+    return state[:i+1], burstpoint, capped
+
+
+def _check_step_cap(capped):
+    """
+    Raise an error if an integration kernel was cut off by the step cap,
+    as its trajectory would then end at an arbitrary point
+    """
+    if capped:
+        raise RuntimeError(
+            "integration did not finish within {} steps".format(_MAX_STEPS))
+
+
+def _step_size(dt, hard):
+    """
+    Internal RK4 step size used by solve_atmospheric_entry for the output
+    timestep dt, or None when it takes forward Euler steps of size dt
+    instead
+    """
+    if dt < 0.02:
+        return None
+    return dt if hard else 0.02
+
+
+def _energy_loss(mass, velocity, altitude):
+    """
+    Kinetic energy lost per unit altitude, in kilotons TNT per km, between
+    consecutive points of a trajectory (zero at the first point)
+    """
+    # kinetic energy in kilotons TNT, differenced per km of altitude
+    energy = 0.5 * mass * velocity * velocity
+    dedz = np.empty_like(energy)
+    dedz[0] = 0
+    np.subtract(energy[:-1], energy[1:], out=dedz[1:])
+    np.divide(dedz[1:], altitude[:-1] - altitude[1:], out=dedz[1:])
+    dedz[1:] /= 4.184e9
+    return dedz
+
+
+# Without numba, use the Cython build of the integrator if it is available
+if not _HAVE_NUMBA:
+    try:
+        from ._integrator import integrate_rk4 as _integrate_rk4  # noqa
+    except ImportError:
+        pass
 
 
 class Planet():
@@ -15,7 +502,8 @@ class Planet():
                                              'resources',
                                              'AltitudeDensityTable.csv')),
                  Cd=1., Ch=0.1, Q=1e7, Cl=1e-3, alpha=0.3,
-                 Rp=6371e3, g=9.81, H=8000., rho0=1.2):
+                 Rp=6371e3, g=9.81, H=8000., rho0=1.2,
+                 linear_density=False):
         """
         Set up the initial parameters and constants for the target planet
 
@@ -56,6 +544,14 @@ class Planet():
         H : float, optional
             Atmospheric scale height (m)
 
+        linear_density : bool, optional
+            Only used with the exponential atmos_func. If True, the RK4
+            solvers extrapolate the density linearly between the stages of
+            a step that moves less than 1e-3 scale heights, instead of
+            evaluating the exponential again. This is faster, but the
+            results change by around 1e-7 relative and those stages are no
+            longer fourth order accurate. Default=False
+
         """
 
         # Input constants
@@ -76,15 +572,23 @@ class Planet():
         self.distance = -1
         self.radius = -1
         self.burstpoint = -1
+        # tabulated density profile, only filled in for atmos_func='tabular'
+        self._table_z = np.empty(0)
+        self._table_rho = np.empty(0)
         try:
             # set function to define atmoshperic density
             if atmos_func == 'exponential':
                 self.rhoa = lambda x: rho0 * np.exp(-x / H)
+                self._atmos_kind = (_ATMOS_EXPONENTIAL_LINEAR
+                                    if linear_density
+                                    else _ATMOS_EXPONENTIAL)
             elif atmos_func == 'tabular':
                 self.rhoa = self.create_tabular_density(
                                 filename=atmos_filename)
+                self._atmos_kind = _ATMOS_TABULAR
             elif atmos_func == 'constant':
                 self.rhoa = lambda x: rho0
+                self._atmos_kind = _ATMOS_CONSTANT
             else:
                 raise NotImplementedError(
                     "atmos_func must be 'exponential', 'tabular' or 'constant'"
@@ -93,6 +597,16 @@ class Planet():
             print("atmos_func {} not implemented yet.".format(atmos_func))
             print("Falling back to constant density atmosphere for now")
             self.rhoa = lambda x: rho0
+            self._atmos_kind = _ATMOS_CONSTANT
+        # scalar version of rhoa for the IVP burst event, which avoids the
+        # ufunc dispatch of np.exp on a Python float
+        self._H_inv = 1. / H
+        if self._atmos_kind in (_ATMOS_EXPONENTIAL,
+                                _ATMOS_EXPONENTIAL_LINEAR):
+            H_inv = self._H_inv
+            self._rhoa_scalar = lambda x: rho0 * math.exp(-x * H_inv)
+        else:
+            self._rhoa_scalar = self.rhoa
 
     def solve_atmospheric_entry(
             self, radius, velocity, density, strength, angle,
@@ -133,7 +647,8 @@ class Planet():
             input
 
         backend : str, optional
-            Which solving method to use. Default='FE'
+            Which solving method to use, 'RK4', 'FE' or 'IVP' (adaptive
+            steps with scipy's solve_ivp). Default='RK4'
 
         hard : bool, optional
             if True, the solver will use the passed in stepsize.
@@ -157,45 +672,163 @@ class Planet():
             solver = self.solve_atmospheric_entry_FE
         elif backend == "RK4":
             solver = self.solve_atmospheric_entry_RK4
-        else:
+        elif backend != "IVP":
             try:
                 raise NotImplementedError(
-                        "backend must be 'FE' or 'RK4' "
+                        "backend must be 'FE', 'RK4' or 'IVP' "
                         )
             except NotImplementedError:
                 print("solving method {} not implemented yet.".format(backend))
                 print("Falling back to FE for now")
                 solver = self.solve_atmospheric_entry_FE
-        if dt >= 0.02:
-            tempdt = 0.02
-            if hard:
-                tempdt = dt
-            solver(radius, velocity, angle,
-                   init_altitude, tempdt, dt)
-        else:
+        tempdt = _step_size(dt, hard)
+        if backend == "IVP":
+            # the adaptive solver chooses its own steps for any dt
+            self.solve_atmospheric_entry_IVP(radius, velocity, angle,
+                                             init_altitude, dt)
+        elif tempdt is None:
             self.solve_atmospheric_entry_FE(radius, velocity, angle,
                                             init_altitude, dt, dt)
-        if not radians:
-            all_angle = [i/np.pi * 180 for i in self.angle]
         else:
-            all_angle = self.angle
-        result = pd.DataFrame({'velocity': self.velocity,
-                               'mass': self.mass,
-                               'angle': all_angle,
-                               'altitude': self.altitude,
-                               'distance': self.distance,
-                               'radius': self.radius,
-                               'time': self.alltimestep})
-        n = len(result)
-        if self.stopping(
-                result.loc[n-1, "velocity"],
-                result.loc[n-1, "mass"],
-                result.loc[n-1, "altitude"],
-                result.loc[n-1, 'radius']):
-            if result.loc[n-1, "altitude"] <= 0:
-                pass
+            solver(radius, velocity, angle,
+                   init_altitude, tempdt, dt)
+        data = self._state
+        if not radians:
+            # the planet keeps its trajectory in radians
+            data = data.copy()
+            data[:, 2] *= 180 / np.pi
+        result = pd.DataFrame(data, columns=['velocity', 'mass', 'angle',
+                                             'altitude', 'distance',
+                                             'radius', 'time'],
+                              copy=False)
         return result
 
+    def _ensemble_scenarios(self, params, dt, radians, hard):
+        """
+        Scenario array of an ensemble with the angles in radians, and the
+        internal RK4 step size that solve_atmospheric_entry would use for
+        the output timestep dt (None when it takes forward Euler steps)
+        """
+        params = np.array(params, dtype=np.float64, ndmin=2)
+        if not radians:
+            params[:, 4] *= np.pi / 180
+        return params, _step_size(dt, hard)
+
+    def solve_ensemble_jit(self, params, init_altitude=100e3, dt=0.05,
+                           radians=False, hard=False):
+        """
+        Solve and analyse many impact scenarios in parallel with the RK4
+        method, without building the trajectory of each one
+
+        Parameters
+        ----------
+        params : array_like
+            A (K, 5) array with one scenario per row, giving the radius (m),
+            velocity (m/s), density (kg/m^3), strength (N/m^2) and angle
+            of the asteroid, in the same units as solve_atmospheric_entry
+
+        init_altitude : float, optional
+            Initial altitude in m
+
+        dt : float, optional
+            The output timestep, in s. It must be at least 0.02, as
+            solve_atmospheric_entry uses forward Euler steps below that
+
+        radians : logical, optional
+            Whether angles are given in degrees or radians. Default=False
+
+        hard : bool, optional
+            if True, the solver will use the passed in stepsize.
+
+        Returns
+        -------
+        outcomes : DataFrame
+            A pandas dataframe with one row per scenario, and the columns
+            ``outcome``, ``burst_peak_dedz``, ``burst_altitude``,
+            ``burst_distance`` and ``burst_energy`` as returned by
+            analyse_outcome
+        """
+        params, tempdt = self._ensemble_scenarios(params, dt, radians, hard)
+        if tempdt is None:
+            raise ValueError(
+                "solve_ensemble_jit only runs the RK4 solver, which "
+                "solve_atmospheric_entry uses for dt >= 0.02")
+        stats = np.empty((len(params), 6))
+        _integrate_many(params, float(init_altitude), float(tempdt),
+                        float(dt), *self._kernel_constants(),
+                        self._atmos_kind, self._table_z, self._table_rho,
+                        stats)
+        _check_step_cap(stats[:, 5].any())
+        return pd.DataFrame({
+            'outcome': np.where(stats[:, 4] > 0, 'Cratering', 'Airburst'),
+            'burst_peak_dedz': stats[:, 0],
+            'burst_altitude': stats[:, 1],
+            'burst_distance': stats[:, 2],
+            'burst_energy': stats[:, 3]})
+
+    def solve_ensemble(self, params, init_altitude=100e3, dt=0.05,
+                       radians=False, hard=False, max_workers=None):
+        """
+        Solve and analyse many impact scenarios as solve_atmospheric_entry
+        does, running one integration per scenario on a pool of threads.
+        The integrators release the GIL, so the scenarios run concurrently.
+
+        Parameters
+        ----------
+        params : array_like
+            A (K, 5) array with one scenario per row, giving the radius (m),
+            velocity (m/s), density (kg/m^3), strength (N/m^2) and angle
+            of the asteroid, in the same units as solve_atmospheric_entry
+
+        init_altitude : float, optional
+            Initial altitude in m
+
+        dt : float, optional
+            The output timestep, in s. Below 0.02 forward Euler steps are
+            taken, as in solve_atmospheric_entry
+
+        radians : logical, optional
+            Whether angles are given in degrees or radians. Default=False
+
+        hard : bool, optional
+            if True, the solver will use the passed in stepsize.
+
+        max_workers : int, optional
+            Number of threads to use. Default is the number of CPUs
+
+        Returns
+        -------
+        outcomes : DataFrame
+            A pandas dataframe with one row per scenario, and the columns
+            ``outcome``, ``burst_peak_dedz``, ``burst_altitude``,
+            ``burst_distance`` and ``burst_energy`` as returned by
+            analyse_outcome
+        """
+        params, tempdt = self._ensemble_scenarios(params, dt, radians, hard)
+        constants = self._kernel_constants()
+        atmos = (self._atmos_kind, self._table_z, self._table_rho)
+
+        def solve(row):
+            radius, velocity, density, strength, angle = row
+            if tempdt is None:
+                state, _, capped = _integrate_fe(
+                    radius, velocity, angle, float(init_altitude),
+                    float(dt), *constants, strength, density, *atmos)
+            else:
+                state, _, capped = _integrate_rk4(
+                    radius, velocity, angle, float(init_altitude),
+                    float(tempdt), float(dt), *constants, strength, density,
+                    *atmos)
+            _check_step_cap(capped)
+            return self.analyse_outcome(state)
+
+        with ThreadPoolExecutor(
+                max_workers=max_workers or os.cpu_count()) as pool:
+            outcomes = list(pool.map(solve, params.tolist()))
+        return pd.DataFrame(outcomes, columns=[
+            'outcome', 'burst_peak_dedz', 'burst_altitude',
+            'burst_distance', 'burst_energy'])
+
     def calculate_energy(self, result):
         """
         Function to calculate the kinetic energy lost per unit altitude in
@@ -215,18 +848,9 @@ class Planet():
 
         """
 
-        # Replace these lines with your code to add the dedz column to
-        # the result DataFrame
-        mass = result["mass"]
-        velocity = result["velocity"]
-        altitude = np.array(result["altitude"])
-        dedz = np.array(0.5 * mass / (10**5) * velocity /
-                        (10**4) * velocity / 4.184)
-        temp = (dedz[1:] - dedz[:-1]) / (altitude[:-1] - altitude[1:])
-        temp = temp
-        temp = np.insert(temp, 0, 0)
-        result.insert(len(result.columns),
-                      'dedz', -temp)
+        result['dedz'] = _energy_loss(result["mass"].to_numpy(copy=False),
+                                      result["velocity"].to_numpy(copy=False),
+                                      result["altitude"].to_numpy(copy=False))
         return result
 
     def analyse_outcome(self, result):
@@ -234,9 +858,11 @@ class Planet():
         Inspect a pre-found solution to calculate the impact and airburst stats
         Parameters
         ----------
-        result : DataFrame
+        result : DataFrame or ndarray
             pandas dataframe with velocity, mass, angle, altitude, horizontal
-            distance, radius and dedz as a function of time
+            distance, radius and dedz as a function of time. Alternatively,
+            an array whose first six columns are the velocity, mass, angle,
+            altitude, distance and radius, for which dedz is computed here
 
         Returns
         -------
@@ -249,23 +875,36 @@ class Planet():
                 ``burst_peak_dedz``, ``burst_altitude``,
                 ``burst_distance``, ``burst_energy``
         """
-        burstidx = result['dedz'].idxmax()
-        initial_energy = (0.5 * result["mass"][0]
-                          * result["velocity"][0]**2 / (4.184*10**12))
-        burstenergy = (0.5 * result["mass"][burstidx]
-                       * result["velocity"][burstidx]**2 / (4.184*10**12))
+        if isinstance(result, np.ndarray):
+            velocity = result[:, 0]
+            mass = result[:, 1]
+            altitude = result[:, 3]
+            distance = result[:, 4]
+            dedz = _energy_loss(mass, velocity, altitude)
+        else:
+            velocity = result["velocity"].to_numpy(copy=False)
+            mass = result["mass"].to_numpy(copy=False)
+            altitude = result["altitude"].to_numpy(copy=False)
+            distance = result["distance"].to_numpy(copy=False)
+            dedz = result["dedz"].to_numpy(copy=False)
+        # kinetic energies in kilotons TNT
+        inv_kt = 1 / 4.184e12
+        burstidx = int(np.nanargmax(dedz))
+        initial_energy = 0.5 * mass[0] * velocity[0] * velocity[0] * inv_kt
+        burstenergy = (0.5 * mass[burstidx] * velocity[burstidx]
+                       * velocity[burstidx] * inv_kt)
         outcome = "Airburst"
-        if burstidx == len(result) - 1 and result['altitude'][burstidx] <= 100:
+        if burstidx == len(dedz) - 1 and altitude[burstidx] <= 100:
             outcome = "Cratering"
             burstenergy = max(burstenergy, initial_energy - burstenergy)
             burst_altitude = 0
         else:
             burstenergy = initial_energy - burstenergy
-            burst_altitude = result["altitude"][burstidx]
+            burst_altitude = altitude[burstidx]
         outcome = {'outcome': outcome,
-                   'burst_peak_dedz': result['dedz'][burstidx],
+                   'burst_peak_dedz': dedz[burstidx],
                    'burst_altitude': burst_altitude,
-                   'burst_distance': result["distance"][burstidx],
+                   'burst_distance': distance[burstidx],
                    'burst_energy': burstenergy}
         return outcome
 
@@ -279,31 +918,29 @@ class Planet():
         ----------
         filename : str, optional
             Path to the tabular. default="./resources/AltitudeDensityTable.csv"
+            The first line is taken as a header and skipped.
         Returns
         -------
         tabular_density : function
             A function that takes altitude as input and return the density of
             atomosphere density at given altitude.
         """
-        X = []
-        Y = []
-        data = pd.read_csv(filename)
-        for i in data[data.keys()[0]]:
-            temp = i.split()
-            X.append(eval(temp[0]))
-            Y.append(eval(temp[1]))
+        # the first line is a header, as with the original CSV reader
+        data = np.loadtxt(filename, dtype=np.float64, skiprows=1)
+        table_z = np.ascontiguousarray(data[:, 0])
+        table_rho = np.ascontiguousarray(data[:, 1])
+        self._table_z = table_z
+        self._table_rho = table_rho
+
+        X = table_z.tolist()
+        Y = table_rho.tolist()
+        last = len(X) - 1
 
         def tabular_density(x):
             if x > 100e3:
                 return 0
-            if x > X[-1]:
-                pressure = (x - X[-1])/(100e3 - X[-1]) * (0 - Y[-1]) + Y[-1]
-            for i in range(len(X)):
-                if X[i] >= x:
-                    break
-            pressure = (x - X[i-1])/(X[i] - X[i-1]) * (Y[i] - Y[i-1]) + Y[i-1]
-
-            return pressure
+            i = min(bisect_left(X, x), last)
+            return (x - X[i-1])/(X[i] - X[i-1]) * (Y[i] - Y[i-1]) + Y[i-1]
         return tabular_density
 
     def solve_atmospheric_entry_RK4(
@@ -337,47 +974,156 @@ class Planet():
         None
         """
 
-        # Enter your code here to solve the differential equations
-        self.velocity = [velocity]
-        self.mass = [4/3 * np.pi * radius**3 * self.density]
-        self.angle = [angle]
-        self.altitude = [init_altitude]
-        self.distance = [0]
-        self.radius = [radius]
-        self.solver_param = np.array([angle,
-                                      radius,
-                                      init_altitude,
-                                      velocity,
-                                      4/3 * np.pi * radius**3 * self.density,
-                                      0])
-        self.alltimestep = [0]
-        timestep = dt
-        iter_num = 0
-        acumulated_step = 0
-        while True:
-            cpara = self.RK4_helper(timestep)
-            flag = np.isclose(acumulated_step + timestep, actualdt)
-            if acumulated_step + timestep >= actualdt or flag:
-                rate = (actualdt - acumulated_step)/timestep
-                output_para = rate * cpara + self.solver_param
-                self.angle.append(output_para[0])
-                self.radius.append(output_para[1])
-                self.altitude.append(output_para[2])
-                self.velocity.append(output_para[3])
-                self.mass.append(output_para[4])
-                self.distance.append(output_para[5])
-                self.alltimestep.append(actualdt + self.alltimestep[-1])
-                acumulated_step -= actualdt
-            self.solver_param += cpara
-            if self.stopping(self.solver_param[3], self.solver_param[4],
-                             self.solver_param[2], self.solver_param[1]):
-                break
-            iter_num += 1
-            acumulated_step += timestep
-            if flag:
-                acumulated_step = 0
-
-    def RK4_helper(self, timestep):
+        state, burstpoint, capped = _integrate_rk4(
+            float(radius), float(velocity), float(angle),
+            float(init_altitude), float(dt), float(actualdt),
+            *self._kernel_constants(),
+            float(self.strength), float(self.density),
+            self._atmos_kind, self._table_z, self._table_rho)
+        _check_step_cap(capped)
+        self._store_trajectory(state)
+        if self.burstpoint == -1:
+            self.burstpoint = burstpoint
+
+    def solve_atmospheric_entry_IVP(
+            self, radius, velocity, angle,
+            init_altitude, dt):
+        """
+        Solve the system of differential equations for a given impact scenario
+        with scipy's adaptive DOP853 integrator, sampling the dense solution
+        every dt seconds
+
+        The integration is restarted at the onset of fragmentation, where
+        the rate of change of the radius jumps, so that the intact phase is
+        smooth and taken in few, large steps. As in the other backends, the
+        radius stops spreading whenever the ram pressure falls back below
+        the strength, so the fragmenting phase is only piecewise smooth.
+
+        Parameters
+        ----------
+        radius : float
+            The radius of the asteroid in meters
+
+        velocity : float
+            The entery speed of the asteroid in meters/second
+
+        angle : float
+            The initial trajectory angle of the asteroid to the horizontal
+            in radians
+
+        init_altitude : float, optional
+            Initial altitude in m
+
+        dt : float, optional
+            The output timestep, in s. The integration steps are chosen by
+            the integrator
+
+        Returns
+        -------
+        None
+        """
+        args = self._derivative_constants()
+        strength = args[8]
+        rhoa_fn = self._rhoa_scalar
+
+        def rhs(t, y):
+            return _derivatives(y[0], y[1], y[2], y[3], y[4], *args)[:6]
+
+        def burst(t, y):
+            return rhoa_fn(y[2]) * y[3] * y[3] - strength
+        burst.terminal = True
+        burst.direction = 1
+
+        def ground(t, y):
+            return y[2]
+
+        def escape(t, y):
+            return y[2] - init_altitude
+        escape.direction = 1
+
+        def ablated(t, y):
+            return y[4]
+
+        def stopped(t, y):
+            return y[3]
+
+        stops = [ground, escape, ablated, stopped]
+        for event in stops:
+            event.terminal = True
+
+        def integrate(t0, y0, events):
+            sol = solve_ivp(rhs, (t0, t_max), y0, method='DOP853',
+                            dense_output=True, events=events,
+                            rtol=1e-10, atol=1e-8)
+            if not sol.success:
+                raise RuntimeError(
+                    "solve_ivp failed at t={}: {}".format(sol.t[-1],
+                                                          sol.message))
+            return sol
+
+        mass = 4/3 * np.pi * radius**3 * self.density
+        y0 = np.array([angle, radius, init_altitude, velocity, mass, 0.])
+        # the events end the integration, this only matches the step cap of
+        # the other backends
+        t_max = _MAX_STEPS * dt
+        t0 = 0.
+        burst_time = None
+        pieces = []
+        if rhoa_fn(init_altitude) * velocity * velocity > strength:
+            burst_time = 0.
+        else:
+            sol = integrate(0., y0, [burst] + stops)
+            pieces.append(sol)
+            if sol.t_events[0].size:
+                burst_time = t0 = sol.t[-1]
+                y0 = sol.y[:, -1]
+        if burst_time is not None:
+            pieces.append(integrate(t0, y0, stops))
+
+        t_end = pieces[-1].t[-1]
+        times = np.arange(int(t_end / dt) + 1) * dt
+        state = np.empty((times.size, 7))
+        for sol in pieces:
+            section = (times >= sol.t[0]) & (times <= sol.t[-1])
+            y = sol.sol(times[section])
+            state[section, :6] = y[[3, 4, 0, 2, 5, 1]].T
+        state[:, 6] = times
+        self._store_trajectory(state)
+        if burst_time is not None and self.burstpoint == -1:
+            self.burstpoint = int(np.searchsorted(times, burst_time))
+
+    def _store_trajectory(self, state):
+        """
+        Keep an (N, 7) trajectory array, setting the velocity, mass, angle,
+        altitude, distance, radius and alltimestep attributes to views of
+        its columns
+        """
+        self._state = state
+        (self.velocity, self.mass, self.angle, self.altitude,
+         self.distance, self.radius, self.alltimestep) = state.T
+
+    def _kernel_constants(self):
+        """
+        Planet constants in the order expected by the integration kernels,
+        as floats so that a single compiled specialisation of each kernel
+        is reused
+        """
+        return tuple(float(c) for c in (
+            self.Cd, self.Ch, self.Q, self.Cl, self.alpha, self.Rp, self.g,
+            self.H, self.rho0))
+
+    def _derivative_constants(self):
+        """
+        Trailing arguments of the _derivatives kernel for this planet and
+        the current asteroid, read from the attributes on every call
+        """
+        Cd, Ch, Q, Cl, alpha, Rp, g, H, rho0 = self._kernel_constants()
+        return (Cd, Ch, 0.5 / Q, Cl, Rp, g, 1 / H, rho0,
+                float(self.strength), 7 * alpha / (2 * float(self.density)),
+                self._atmos_kind, self._table_z, self._table_rho)
+
+    def RK4_helper(self, timestep, angle, radius, altitude, velocity, mass,
+                   distance):
         """
         Helper function for RK4 method
 
@@ -386,60 +1132,40 @@ class Planet():
         timestep : float
             The stepsize of iteration
 
+        angle, radius, altitude, velocity, mass, distance : float
+            The variables at the start of the step
+
         Returns
         -------
-        change : ndarray
-            A numpy array containing the change of each variable.
+        change : tuple
+            A tuple containing the change of each variable.
             Includes the following variables:
             'angle', 'radius', 'altitude',
             'velocity', 'mass', 'distance'
         """
-        variables = self.solver_param
-        k1 = self.calculator_rk4(variables)
-        k2 = self.calculator_rk4(variables + 0.5 * timestep * k1)
-        k3 = self.calculator_rk4(variables + 0.5 * timestep * k2)
-        k4 = self.calculator_rk4(variables + timestep * k3)
-        change = (k1 + 2 * k2 + 2 * k3 + k4) * timestep / 6
-        return change
+        return _rk4_step(angle, radius, altitude, velocity, mass, timestep,
+                         *self._derivative_constants())[:6]
 
-    def calculator_rk4(self, variables):
+    def calculator_rk4(self, angle, radius, altitude, velocity, mass,
+                       distance):
         """
         Calculate the change of variables at given point
 
         Parameters
         ----------
-        variables : float
-            Angle, radius, altitude, velocity, mass, distance at currenty step
+        angle, radius, altitude, velocity, mass, distance : float
+            The variables at the current step
 
         Returns
         -------
-        result : ndarray
-            A numpy array containing the change of each variable.
+        result : tuple
+            A tuple containing the rate of change of each variable.
             Includes the following variables:
             'angle', 'radius', 'altitude',
             'velocity', 'mass', 'distance'
         """
-        angle, radius, altitude, velocity, mass, _ = variables
-        cos_theta = np.cos(angle)
-        sin_theta = np.sin(angle)
-        area = np.pi * radius**2
-        rhoa = self.rhoa(altitude)
-        rhoAv = rhoa * area * velocity
-        dvdt = -self.Cd * rhoAv * velocity / (2 * mass) + self.g * sin_theta
-        dmdt = -self.Ch * rhoAv * velocity**2 / (2 * self.Q)
-        dthetadt = (-self.Cl * rhoAv / (2 * mass)
-                    + self.g * cos_theta / velocity
-                    - velocity * cos_theta / (self.Rp + altitude))
-        dzdt = -velocity * sin_theta
-        dxdt = velocity * cos_theta / (1 + altitude / self.Rp)
-        ram = self.rhoa(altitude) * velocity**2
-        drdt = 0
-        if ram > self.strength:
-            if self.burstpoint == -1:
-                self.burstpoint = len(self.distance)
-            drdt = (7 * rhoa * self.alpha/2/self.density)**0.5 * velocity
-        result = np.array([dthetadt, drdt, dzdt, dvdt, dmdt, dxdt])
-        return result
+        return _derivatives(angle, radius, altitude, velocity, mass,
+                            *self._derivative_constants())[:6]
 
     def solve_atmospheric_entry_FE(
             self, radius, velocity, angle,
@@ -472,77 +1198,12 @@ class Planet():
         None
         """
 
-        # Enter your code here to solve the differential equations
-        self.velocity = [velocity]
-        self.mass = [4/3 * np.pi * radius**3 * self.density]
-        self.angle = [angle]
-        self.altitude = [init_altitude]
-        self.distance = [0]
-        self.radius = [radius]
-        timestep = dt
-        self.alltimestep = [0]
-        while True:
-            cos_theta = np.cos(self.angle[-1])
-            sin_theta = np.sin(self.angle[-1])
-            area = np.pi * self.radius[-1]**2
-            rhoa = self.rhoa(self.altitude[-1])
-            rhoAv = rhoa * area * self.velocity[-1]
-            dvdt = (-self.Cd * rhoAv * self.velocity[-1] / (2 * self.mass[-1])
-                    + self.g * sin_theta)
-            dmdt = -self.Ch * rhoAv * self.velocity[-1]**2 / (2 * self.Q)
-            dthetadt = (-self.Cl * rhoAv / (2 * self.mass[-1])
-                        + self.g * cos_theta / self.velocity[-1]
-                        - self.velocity[-1] * cos_theta
-                        / (self.Rp + self.altitude[-1]))
-            dzdt = -self.velocity[-1] * sin_theta
-            dxdt = (self.velocity[-1] * cos_theta
-                    / (1 + self.altitude[-1] / self.Rp))
-            ram = self.rhoa(self.altitude[-1]) * self.velocity[-1]**2
-            drdt = 0
-            if ram > self.strength:
-                if self.burstpoint == -1:
-                    self.burstpoint = len(self.distance)
-                drdt = ((7 * rhoa * self.alpha/2/self.density)**0.5
-                        * self.velocity[-1])
-            self.velocity.append(dvdt * timestep + self.velocity[-1])
-            self.mass.append(dmdt * timestep + self.mass[-1])
-            self.altitude.append(dzdt * timestep + self.altitude[-1])
-            self.angle.append(dthetadt * timestep + self.angle[-1])
-            self.distance.append(dxdt * timestep + self.distance[-1])
-            self.radius.append(drdt * timestep + self.radius[-1])
-            self.alltimestep.append(timestep + self.alltimestep[-1])
-            if (self.altitude[-1] <= 0 or self.mass[-1] <= 0 or
-                    self.radius[-1] <= 0 or self.velocity[-1] <= 0 or
-                    self.altitude[-1] >= init_altitude):
-                break
-
-    def stopping(self, newv, newm, newal, newradius):
-        """
-        Decide whether to stop the solver
-
-        Parameters
-        ----------
-        newv : float
-            The current velocity
-
-        newm : float
-            The current mass
-
-        newal : float
-            The current altitude
-
-        newradius : float
-            The current radius
-
-        Returns
-        -------
-        Result: bool
-            True if solver should stop,
-            False if solver should continue
-        """
-        if (newal <= 0 or newm <= 0 or
-                newradius <= 0 or newv <= 0 or
-                newal >= self.altitude[0]):
-            return True
-        else:
-            return False
+        state, burstpoint, capped = _integrate_fe(
+            float(radius), float(velocity), float(angle),
+            float(init_altitude), float(dt), *self._kernel_constants(),
+            float(self.strength), float(self.density),
+            self._atmos_kind, self._table_z, self._table_rho)
+        _check_step_cap(capped)
+        if self.burstpoint == -1:
+            self.burstpoint = burstpoint
+        self._store_trajectory(state)
@@ -1,7 +1,53 @@
 try:
-    from setuptools import setup
+    from setuptools import setup, Extension
+    from setuptools.command.build_ext import build_ext
+    from setuptools.errors import CCompilerError, ExecError, PlatformError
 except ImportError:
-    from distutils.core import setup
+    from distutils.core import setup, Extension
+    from distutils.command.build_ext import build_ext
+    from distutils.errors import (CCompilerError,
+                                  DistutilsExecError as ExecError,
+                                  DistutilsPlatformError as PlatformError)
+
+# The compiled RK4 integrator is optional: it is only used when numba is
+# not installed, and is skipped if Cython is not available
+try:
+    from Cython.Build import cythonize
+    ext_modules = cythonize(
+        [Extension('armageddon._integrator',
+                   ['armageddon/_integrator.pyx'])],
+        compiler_directives={'language_level': 3})
+except ImportError:
+    ext_modules = []
+
+
+class BuildExt(build_ext):
+    """
+    Build the extensions with the optimisation flag of the compiler in use,
+    skipping any that fail to compile as they are all optional
+    """
+    def run(self):
+        try:
+            build_ext.run(self)
+        except PlatformError as err:
+            self.warn('skipping the compiled extensions: {}'.format(err))
+
+    def build_extensions(self):
+        flag = '/O2' if self.compiler.compiler_type == 'msvc' else '-O3'
+        for ext in self.extensions:
+            ext.extra_compile_args = [flag]
+        self.skipped = []
+        build_ext.build_extensions(self)
+        # leave the skipped extensions out of the in-place copy
+        self.extensions = [ext for ext in self.extensions
+                           if ext not in self.skipped]
+
+    def build_extension(self, ext):
+        try:
+            build_ext.build_extension(self, ext)
+        except (CCompilerError, ExecError, PlatformError) as err:
+            self.warn('skipping {}: {}'.format(ext.name, err))
+            self.skipped.append(ext)
 
 
 setup(name='armageddon',
@@ -10,5 +56,7 @@ setup(name='armageddon',
       version='1.0',
       description='Asteroid atmospheric entry solver',
       author='ACSE project',
-      packages=['armageddon']
+      packages=['armageddon'],
+      ext_modules=ext_modules,
+      cmdclass={'build_ext': BuildExt}
       )
@@ -4,7 +4,7 @@ import pandas as pd
 import numpy as np
 import os
 
-from pytest import fixture
+from pytest import fixture, importorskip, raises
 
 
 # Use pytest fixtures to generate objects we know we'll reuse.
@@ -54,6 +54,23 @@ def outcome(planet, result):
     return outcome
 
 
+@fixture(scope='module')
+def scenario():
+    return dict(radius=35., velocity=1.9e4, density=3000.,
+                strength=1e6, angle=45.)
+
+
+def assert_outcomes_close(outcome, reference, **kwargs):
+    """
+    Check two outcomes, or columns of ensemble outcomes, agree
+    """
+    assert np.all(np.asarray(outcome['outcome'])
+                  == np.asarray(reference['outcome']))
+    for key in ('burst_peak_dedz', 'burst_altitude',
+                'burst_distance', 'burst_energy'):
+        assert np.allclose(outcome[key], reference[key], **kwargs)
+
+
 def test_import(armageddon):
     assert armageddon
 
@@ -83,6 +100,35 @@ def test_atmos_filename(planet):
     assert os.path.isfile(planet.atmos_filename)
 
 
+def test_tabular_density(armageddon, scenario):
+
+    planet = armageddon.Planet(atmos_func='tabular')
+    table = np.loadtxt(planet.atmos_filename, skiprows=1)
+    z, rho = table[:, 0], table[:, 1]
+
+    def interpolate(x, lo, hi):
+        return (x - z[lo]) / (z[hi] - z[lo]) * (rho[hi] - rho[lo]) + rho[lo]
+
+    # at a node, between nodes, below the table (which pairs the first
+    # and last nodes), above the table and above 100 km
+    expected = {2000.: rho[1],
+                3000.: 0.5 * (rho[1] + rho[2]),
+                -1000.: interpolate(-1000., -1, 0),
+                87e3: interpolate(87e3, -2, -1),
+                101e3: 0.}
+    for altitude, density in expected.items():
+        assert np.isclose(planet.rhoa(altitude), density)
+        assert np.isclose(armageddon.solver._tabular_density(
+            altitude, planet._table_z, planet._table_rho), density)
+
+    result = planet.solve_atmospheric_entry(**scenario)
+    assert np.isclose(result['altitude'][0], 100e3)
+    assert np.all(np.diff(result['altitude']) < 0)
+    assert np.all(np.isfinite(result.to_numpy()))
+    assert planet.analyse_outcome(
+        planet.calculate_energy(result))['outcome'] == 'Airburst'
+
+
 def test_solve_atmospheric_entry(result):
 
     assert type(result) is pd.DataFrame
@@ -92,6 +138,71 @@ def test_solve_atmospheric_entry(result):
         assert key in result.columns
 
 
+def test_solve_atmospheric_entry_rk4(planet):
+
+    result = planet.solve_atmospheric_entry(radius=10., velocity=2.0e4,
+                                            density=3000., strength=1e5,
+                                            angle=45., dt=0.05)
+
+    assert np.allclose(np.diff(result['time']), 0.05)
+    assert np.isclose(result['velocity'][0], 2.0e4)
+    assert np.isclose(result['angle'][0], 45.)
+    assert np.isclose(result['altitude'][0], 100e3)
+    assert np.all(np.diff(result['altitude']) < 0)
+
+
+def test_solve_atmospheric_entry_ivp(planet, scenario):
+
+    result = planet.solve_atmospheric_entry(**scenario, backend='IVP')
+    outcome = planet.analyse_outcome(planet.calculate_energy(result))
+    reference = planet.analyse_outcome(planet.calculate_energy(
+        planet.solve_atmospheric_entry(**scenario)))
+
+    assert np.allclose(np.diff(result['time']), 0.05)
+    assert np.isclose(result['altitude'][0], 100e3)
+    assert_outcomes_close(outcome, reference, rtol=1e-2)
+
+    # the adaptive solver also handles output steps below 0.02, sampling
+    # the same solution more finely
+    fine = planet.solve_atmospheric_entry(**scenario, backend='IVP',
+                                          dt=0.01)
+    assert np.allclose(fine.to_numpy()[::5][:len(result)],
+                       result.to_numpy()[:, :7])
+
+
+def test_linear_density(armageddon, planet, scenario):
+
+    exact = planet.solve_atmospheric_entry(**scenario)
+    linear = armageddon.Planet(linear_density=True).solve_atmospheric_entry(
+        **scenario)
+
+    # the extrapolation is in use, but its error is far below the RK4
+    # truncation error
+    assert not np.array_equal(linear.to_numpy(), exact.to_numpy())
+    assert len(linear) == len(exact)
+    scale = np.abs(exact.to_numpy()).max(axis=0)
+    assert np.allclose(linear, exact, rtol=1e-6, atol=1e-6 * scale)
+
+
+def test_compiled_integrator(armageddon):
+
+    _integrator = importorskip('armageddon._integrator')
+    tabular = armageddon.Planet(atmos_func='tabular')
+    args = (35., 1.9e4, np.radians(45.), 100e3, 0.05, 0.05,
+            1., 0.1, 1e7, 1e-3, 0.3, 6371e3, 9.81, 8000., 1.2, 1e6, 3000.)
+
+    # exponential, tabular, constant and linearly extrapolated exponential
+    for atmos_kind in range(4):
+        state, burst, capped = _integrator.integrate_rk4(
+            *args, atmos_kind, tabular._table_z, tabular._table_rho)
+        expected, expected_burst, _ = armageddon.solver._integrate_rk4(
+            *args, atmos_kind, tabular._table_z, tabular._table_rho)
+        assert not capped
+        assert burst == expected_burst
+        assert state.shape == expected.shape
+        assert np.allclose(state, expected, rtol=1e-10, atol=1e-8)
+
+
 def test_calculate_energy(planet, result):
 
     energy = planet.calculate_energy(result=result)
@@ -112,6 +223,61 @@ def test_analyse_outcome(planet, outcome):
         assert key in outcome.keys()
 
 
+def test_analyse_outcome_array(planet, scenario):
+
+    result = planet.solve_atmospheric_entry(**scenario)
+    state = result.to_numpy()[:, :6]
+    outcome = planet.analyse_outcome(planet.calculate_energy(result))
+
+    assert planet.analyse_outcome(state) == outcome
+
+
+def test_solve_ensemble_jit(planet, scenario):
+
+    params = np.array([list(scenario.values()),
+                       [200., 2.0e4, 3000., 1e5, 45.]])
+    outcomes = planet.solve_ensemble_jit(params)
+
+    assert type(outcomes) is pd.DataFrame
+    assert len(outcomes) == len(params)
+    for i, row in enumerate(params):
+        result = planet.calculate_energy(
+            planet.solve_atmospheric_entry(*row))
+        assert_outcomes_close(outcomes.iloc[i],
+                              planet.analyse_outcome(result))
+
+
+def test_solve_ensemble_jit_small_dt(planet, scenario):
+
+    params = np.array([list(scenario.values())])
+
+    # below dt = 0.02 solve_atmospheric_entry takes forward Euler steps,
+    # which the RK4 ensemble kernel cannot reproduce
+    with raises(ValueError):
+        planet.solve_ensemble_jit(params, dt=0.01)
+
+
+def test_solve_ensemble(planet, scenario):
+
+    params = np.array([list(scenario.values()),
+                       [200., 2.0e4, 3000., 1e5, 45.],
+                       [10., 2.0e4, 3000., 1e5, 30.]])
+    outcomes = planet.solve_ensemble(params, max_workers=2)
+    reference = planet.solve_ensemble_jit(params)
+
+    assert type(outcomes) is pd.DataFrame
+    assert_outcomes_close(outcomes, reference)
+
+    # below dt = 0.02 the ensemble takes the same forward Euler steps as
+    # solve_atmospheric_entry
+    outcomes = planet.solve_ensemble(params, dt=0.01, max_workers=2)
+    for i, row in enumerate(params):
+        result = planet.calculate_energy(
+            planet.solve_atmospheric_entry(*row, dt=0.01))
+        assert_outcomes_close(outcomes.iloc[i],
+                              planet.analyse_outcome(result))
+
+
 def test_damage_zones(armageddon):
 
     outcome = {'burst_peak_dedz': 1000.,